@@ -1,3 +1,11 @@
+import csv
+import json
+import sys
+import time
+
+from operation_log import OperationLog
+
+
 def show_commands():
     print("\nAvailable commands:")
     print("  - balance")
@@ -7,14 +15,129 @@ def show_commands():
     print("  - list")
     print("  - warehouse")
     print("  - review")
+    print("  - by-product")
+    print("  - by-type")
+    print("  - by-amount")
     print("  - end")
 
 
+def apply_operation(state, op):
+    """Apply a balance/sale/purchase operation; return an error message or None."""
+    warehouse = state['warehouse']
+    if op['command'] == 'balance':
+        state['balance'] += op['amount']
+
+    elif op['command'] == 'sale':
+        product, price, quantity = op['product'], op['price'], op['quantity']
+        if product not in warehouse or warehouse[product]['quantity'] < quantity:
+            return "Not enough inventory to complete the sale."
+        warehouse[product]['quantity'] -= quantity
+        state['balance'] += price * quantity
+
+    elif op['command'] == 'purchase':
+        product, price, quantity = op['product'], op['price'], op['quantity']
+        total_cost = price * quantity
+        if total_cost > state['balance']:
+            return "Insufficient funds for this purchase."
+        if product in warehouse:
+            warehouse[product]['quantity'] += quantity
+            warehouse[product]['price'] = price
+        else:
+            warehouse[product] = {'price': price, 'quantity': quantity}
+        state['balance'] -= total_cost
+
+    else:
+        return f"Unknown command '{op['command']}'."
+
+    state['operations'].append(op)
+    return None
+
+
+def print_operations(operations, indices):
+    """Print the operations at the given log indices."""
+    if not indices:
+        print("No matching operations.")
+        return
+    print(f"Found {len(indices)} operations:")
+    for i in indices:
+        print(f"{i}: {operations[i]}")
+
+
+def parse_batch_line(line):
+    """Parse one batch line into an operation dict.
+
+    Lines are either CSV (balance,<amount>,<comment> / sale,<product>,<price>,<quantity> /
+    purchase,<product>,<price>,<quantity>) or a JSON object using the same keys as
+    the stored operations, e.g. {"command": "sale", "product": "Apple", "price": 2.5, "quantity": 3}.
+    """
+    if line.lstrip().startswith('{'):
+        op = json.loads(line)
+        # Product names and comments are interned and used as dict keys
+        if op.get('command') == 'balance':
+            comment = op.get('comment', '')
+            if not isinstance(comment, str):
+                raise ValueError("comment must be a string")
+            return {'command': 'balance', 'amount': float(op['amount']), 'comment': comment}
+        if not isinstance(op['product'], str):
+            raise ValueError("product must be a string")
+        return {'command': op['command'], 'product': op['product'],
+                'price': float(op['price']), 'quantity': int(op['quantity'])}
+
+    fields = next(csv.reader([line]))
+    command = fields[0].strip().lower()
+    if command == 'balance':
+        return {'command': 'balance', 'amount': float(fields[1]), 'comment': ','.join(fields[2:])}
+    return {'command': command, 'product': fields[1].strip(),
+            'price': float(fields[2]), 'quantity': int(fields[3])}
+
+
+def run_batch(stream, state):
+    """Apply every operation in a command stream and print a summary."""
+    applied = rejected = invalid = 0
+    started = time.perf_counter()
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        try:
+            op = parse_batch_line(line)
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            invalid += 1
+            print(f"Line {line_number}: invalid operation ({e}).")
+            continue
+        error = apply_operation(state, op)
+        if error:
+            rejected += 1
+            print(f"Line {line_number}: {error}")
+        else:
+            applied += 1
+    elapsed = time.perf_counter() - started
+
+    total = applied + rejected + invalid
+    print(f"\nProcessed {total} operations in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:.0f} ops/s): "
+          f"{applied} applied, {rejected} rejected, {invalid} invalid.")
+    print(f"Current account balance: {state['balance']:.2f}")
+
+
 def main():
-    account_balance = 0.0
-    warehouse = {}  # product -> {'price': float, 'quantity': int}
-    operations = []
+    state = {
+        'balance': 0.0,
+        'warehouse': {},  # product -> {'price': float, 'quantity': int}
+        'operations': OperationLog(),
+    }
+
+    # Batch mode: python "Accounting system.py" --batch [file|-]
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        path = sys.argv[2] if len(sys.argv) > 2 else "-"
+        if path == "-":
+            run_batch(sys.stdin, state)
+        else:
+            with open(path, 'r', newline='') as f:
+                run_batch(f, state)
+        return
 
+    warehouse = state['warehouse']
+    operations = state['operations']
     show_commands()
 
     while True:
@@ -23,8 +146,7 @@ def main():
             try:
                 amount = float(input("Enter amount to add/subtract (use negative for subtraction): "))
                 comment = input("Comment: ")
-                account_balance += amount
-                operations.append({'command': 'balance', 'amount': amount, 'comment': comment})
+                apply_operation(state, {'command': 'balance', 'amount': amount, 'comment': comment})
             except ValueError:
                 print("Invalid amount. Please enter a numeric value.")
 
@@ -34,12 +156,9 @@ def main():
                 price = float(input("Sale price per item: "))
                 quantity = int(input("Quantity sold: "))
 
-                if product in warehouse and warehouse[product]['quantity'] >= quantity:
-                    warehouse[product]['quantity'] -= quantity
-                    account_balance += price * quantity
-                    operations.append({'command': 'sale', 'product': product, 'price': price, 'quantity': quantity})
-                else:
-                    print("Not enough inventory to complete the sale.")
+                error = apply_operation(state, {'command': 'sale', 'product': product, 'price': price, 'quantity': quantity})
+                if error:
+                    print(error)
             except ValueError:
                 print("Invalid input. Please enter numeric values for price and quantity.")
 
@@ -48,23 +167,15 @@ def main():
                 product = input("Product name: ").strip()
                 price = float(input("Purchase price per item: "))
                 quantity = int(input("Quantity to purchase: "))
-                total_cost = price * quantity
 
-                if total_cost > account_balance:
-                    print("Insufficient funds for this purchase.")
-                else:
-                    if product in warehouse:
-                        warehouse[product]['quantity'] += quantity
-                        warehouse[product]['price'] = price
-                    else:
-                        warehouse[product] = {'price': price, 'quantity': quantity}
-                    account_balance -= total_cost
-                    operations.append({'command': 'purchase', 'product': product, 'price': price, 'quantity': quantity})
+                error = apply_operation(state, {'command': 'purchase', 'product': product, 'price': price, 'quantity': quantity})
+                if error:
+                    print(error)
             except ValueError:
                 print("Invalid input. Please enter numeric values for price and quantity.")
 
         elif command == "account":
-            print(f"Current account balance: {account_balance:.2f}")
+            print(f"Current account balance: {state['balance']:.2f}")
 
         elif command == "list":
             if warehouse:
@@ -97,6 +208,34 @@ def main():
             except ValueError:
                 print("Invalid indices. Please enter integer values or leave blank.")
 
+        elif command == "by-product":
+            product = input("Product name: ").strip()
+            totals = operations.product_totals(product)
+            if totals is None:
+                print("No operations found for this product.")
+            else:
+                print_operations(operations, operations.indices_for_product(product))
+                print(f"Sold {totals['units_sold']} units in {totals['sales']} sales for {totals['revenue']:.2f}; "
+                      f"purchased {totals['units_purchased']} units in {totals['purchases']} purchases "
+                      f"for {totals['spent']:.2f}.")
+
+        elif command == "by-type":
+            op_type = input("Operation type (balance/sale/purchase): ").strip().lower()
+            if op_type in ("balance", "sale", "purchase"):
+                print_operations(operations, operations.indices_for_command(op_type))
+            else:
+                print("Unknown operation type.")
+
+        elif command == "by-amount":
+            try:
+                low_input = input("Minimum amount (leave empty for no minimum): ").strip()
+                high_input = input("Maximum amount (leave empty for no maximum): ").strip()
+                low = float(low_input) if low_input else float("-inf")
+                high = float(high_input) if high_input else float("inf")
+                print_operations(operations, operations.indices_for_amount(low, high))
+            except ValueError:
+                print("Invalid amount. Please enter numeric values or leave blank.")
+
         elif command == "end":
             print("Program terminated.")
             break
@@ -3,11 +3,20 @@ import sys
 import os
 import csv
 
+from reader import CSVHandler
+
 
 def print_usage():
-    print(f"Usage: {sys.argv[0]} <src> <dst> <change1> <change2> ...")
+    print(f"Usage: {sys.argv[0]} [options] <src> <dst> <change1> <change2> ...")
+    print('Options:')
+    print('  --changes FILE   read more X,Y,value changes from FILE, one per line')
+    print('  --index          locate changed rows through the cached row-offset index')
+    print('  --no-display     do not print the modified content')
+    print('  --page-size N    print the modified content N rows at a time')
     print('Example:')
     print(f"  {sys.argv[0]} data.csv new_data.csv 0,1,Hello 2,3,World")
+    print(f"  {sys.argv[0]} --index big.csv fixed.csv 0,250000,Hello")
+    print(f"  {sys.argv[0]} --changes corrections.txt --no-display big.csv fixed.csv")
     sys.exit(1)
 
 
@@ -21,38 +30,75 @@ def list_files_in_dir(path):
         print(f"Error listing directory: {e}")
 
 
-def apply_changes(data, changes):
-    for change in changes:
-        try:
-            x_str, y_str, value = change.split(',', 2)
-            x = int(x_str)
-            y = int(y_str)
-
-            if y < 0 or y >= len(data):
-                print(f"Warning: Row index {y} out of range. Skipping.")
-                continue
-            if x < 0 or x >= len(data[y]):
-                print(f"Warning: Column index {x} out of range in row {y}. Skipping.")
-                continue
-
-            data[y][x] = value
-        except ValueError:
-            print(f"Invalid change format: '{change}'. Expected format 'X,Y,value'. Skipping.")
-
-
-def display_csv(data):
+def load_changes(path):
+    """Yield 'X,Y,value' changes from a file, skipping blank lines and # comments."""
+    with open(path, 'r', newline='') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if line.strip() and not line.startswith('#'):
+                yield line
+
+
+def copy_with_changes(src, dst, changes):
+    """Copy src to dst in one streaming pass, applying changes as rows go by.
+
+    The copy is written next to dst and moved into place, so dst may be src.
+    Returns the number of rows written.
+    """
+    handler = CSVHandler(src, dst)
+    by_row = handler.group_changes(changes)
+    count = 0
+    with open(src, 'r', newline='') as f_in, open(dst + '.tmp', 'w', newline='') as f_out:
+        writer = csv.writer(f_out)
+        for row in handler.apply_row_changes(csv.reader(f_in), by_row):
+            writer.writerow(row)
+            count += 1
+    os.replace(dst + '.tmp', dst)
+    for y in sorted(by_row):
+        print(f"Warning: Row index {y} out of range. Skipping.")
+    return count
+
+
+def display_csv(data, page_size=None):
     print("\nModified CSV Content:")
-    for row in data:
+    for i, row in enumerate(data, start=1):
         print(','.join(row))
+        if page_size and i % page_size == 0:
+            try:
+                if input("-- More (Enter to continue, q to stop) --").strip().lower() == 'q':
+                    return
+            except EOFError:
+                return
 
 
 def main():
-    if len(sys.argv) < 3:
+    args = sys.argv[1:]
+    use_index = False
+    display = True
+    page_size = None
+    change_file = None
+    while args and args[0].startswith('--'):
+        option = args.pop(0)
+        try:
+            if option == '--index':
+                use_index = True
+            elif option == '--no-display':
+                display = False
+            elif option == '--page-size':
+                page_size = int(args.pop(0))
+            elif option == '--changes':
+                change_file = args.pop(0)
+            else:
+                print_usage()
+        except (IndexError, ValueError):
+            print_usage()
+
+    if len(args) < 2:
         print_usage()
 
-    src = sys.argv[1]
-    dst = sys.argv[2]
-    changes = sys.argv[3:]
+    src = args[0]
+    dst = args[1]
+    changes = args[2:]
 
     # Check if source file exists
     if not os.path.isfile(src):
@@ -60,32 +106,40 @@ def main():
         list_files_in_dir(src)
         sys.exit(1)
 
-    # Read CSV file
-    try:
-        with open(src, 'r', newline='') as f:
-            reader = csv.reader(f)
-            data = [row for row in reader]
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        sys.exit(1)
-
-    # Apply user changes
-    if changes:
-        apply_changes(data, changes)
-
-    # Display modified CSV
-    display_csv(data)
+    if change_file:
+        try:
+            changes += list(load_changes(change_file))
+        except Exception as e:
+            print(f"Error reading changes file: {e}")
+            sys.exit(1)
 
-    # Save to destination file
+    # Indexed mode: only the changed rows are read, modified and displayed
+    if use_index:
+        try:
+            changed = CSVHandler(src, dst).write_indexed_changes(changes)
+            if display:
+                print("\nModified Rows:")
+                for y, row in sorted(changed.items()):
+                    print(f"{y}: " + ','.join(row))
+            print(f"\nFile successfully saved to: {dst}")
+        except Exception as e:
+            print(f"Error writing CSV file: {e}")
+            sys.exit(1)
+        return
+
+    # Apply user changes while copying the source to the destination
     try:
-        with open(dst, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(data)
+        copy_with_changes(src, dst, changes)
         print(f"\nFile successfully saved to: {dst}")
     except Exception as e:
         print(f"Error writing CSV file: {e}")
         sys.exit(1)
 
+    # Display modified CSV, streamed back from the destination
+    if display:
+        with open(dst, 'r', newline='') as f:
+            display_csv(csv.reader(f), page_size)
+
 
 if __name__ == "__main__":
     main()
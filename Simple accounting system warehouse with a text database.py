@@ -1,8 +1,15 @@
 import ast
+import json
 import os
+import sys
 
+from operation_log import StoredOperationLog
 
-DATA_FILE = "data.txt"
+
+STATE_FILE = "state.json"            # balance, warehouse and the size of the operations file
+OPERATIONS_FILE = "operations.jsonl"  # one JSON operation per line, read only when reviewed
+LEGACY_DATA_FILE = "data.txt"         # old str(dict) format, upgraded on first start
+CHECKPOINT_EVERY = 100                # operations between state file rewrites
 
 
 def show_commands():
@@ -14,48 +21,143 @@ def show_commands():
     print("  - list")
     print("  - warehouse")
     print("  - review")
+    print("  - by-product")
+    print("  - by-type")
+    print("  - by-amount")
     print("  - end")
 
 
+def print_operations(operations, indices):
+    """Print the operations at the given log indices."""
+    if not indices:
+        print("No matching operations.")
+        return
+    print(f"Found {len(indices)} operations:")
+    for i in indices:
+        print(f"{i}: {operations[i]}")
+
+
 def load_data():
-    """Load balance, warehouse, and operations from file if it exists."""
-    if not os.path.exists(DATA_FILE):
-        print("No existing data file found. Starting with empty state.")
-        return 0.0, {}, []
+    """Load balance and warehouse from the state file; operations are read lazily."""
+    if not os.path.exists(STATE_FILE):
+        if os.path.exists(LEGACY_DATA_FILE):
+            return upgrade_legacy_data()
+        if not os.path.exists(OPERATIONS_FILE):
+            print("No existing data file found. Starting with empty state.")
+            return 0.0, {}, StoredOperationLog(OPERATIONS_FILE)
+
+    # Without a usable state file every operation comes from replaying the log
+    balance, warehouse, stored, stored_bytes = 0.0, {}, 0, 0
+    if os.path.exists(STATE_FILE):
+        try:
+            with open(STATE_FILE, "r") as file:
+                state = json.load(file)
+            balance, warehouse = state["balance"], state["warehouse"]
+            stored, stored_bytes = state["operations"], state["operations_bytes"]
+        except Exception as e:
+            print(f"Error loading data file: {e}")
+            print(f"Rebuilding the state from {OPERATIONS_FILE}.")
+            balance, warehouse, stored, stored_bytes = 0.0, {}, 0, 0
 
     try:
-        with open(DATA_FILE, "r") as file:
+        operations = StoredOperationLog(OPERATIONS_FILE, stored, stored_bytes)
+        recovered = operations.read_unsaved_tail()
+        for op in recovered:
+            balance = replay_operation(balance, warehouse, op)
+    except Exception as e:
+        # Starting empty would let the next autosave truncate the history
+        print(f"Error loading {OPERATIONS_FILE}: {e}")
+        print("Fix or move the data files before starting again.")
+        sys.exit(1)
+    if recovered:
+        print(f"Recovered {len(recovered)} operations saved after the last checkpoint.")
+    print("Data loaded successfully.")
+    return balance, warehouse, operations
+
+
+def upgrade_legacy_data():
+    """Convert the old data.txt into the state/operations files, keeping a backup."""
+    operations = StoredOperationLog(OPERATIONS_FILE)
+    try:
+        with open(LEGACY_DATA_FILE, "r") as file:
             content = file.read().strip()
-            if not content:
-                return 0.0, {}, []
-            data = ast.literal_eval(content)
-            print("Data loaded successfully.")
-            return (
-                data.get("balance", 0.0),
-                data.get("warehouse", {}),
-                data.get("operations", []),
-            )
+        data = ast.literal_eval(content) if content else {}
+        for op in data.get("operations", []):
+            operations.append(op)
+        balance, warehouse = data.get("balance", 0.0), data.get("warehouse", {})
     except Exception as e:
         print(f"Error loading data file: {e}")
         print("Starting with empty state.")
-        return 0.0, {}, []
+        return 0.0, {}, StoredOperationLog(OPERATIONS_FILE)
+
+    save_data(balance, warehouse, operations)
+    if not os.path.exists(STATE_FILE):
+        return balance, warehouse, operations  # keep data.txt until the upgrade succeeds
+    os.replace(LEGACY_DATA_FILE, LEGACY_DATA_FILE + ".bak")
+    print(f"Upgraded {LEGACY_DATA_FILE} to the new format (backup kept as {LEGACY_DATA_FILE}.bak).")
+    return balance, warehouse, operations
+
+
+def replay_operation(balance, warehouse, op):
+    """Re-apply an already validated operation to the state; return the new balance."""
+    if op['command'] == 'balance':
+        return balance + op['amount']
+    product, price, quantity = op['product'], op['price'], op['quantity']
+    if op['command'] == 'sale':
+        warehouse[product]['quantity'] -= quantity
+        return balance + price * quantity
+    if product in warehouse:
+        warehouse[product]['quantity'] += quantity
+        warehouse[product]['price'] = price
+    else:
+        warehouse[product] = {'price': price, 'quantity': quantity}
+    return balance - price * quantity
+
+
+def write_state(balance, warehouse, operations):
+    """Atomically replace the state file with a checkpoint of the saved operations."""
+    state = {
+        "balance": balance,
+        "warehouse": warehouse,
+        "operations": operations.stored,
+        "operations_bytes": operations.stored_bytes,
+    }
+    with open(STATE_FILE + ".tmp", "w") as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(STATE_FILE + ".tmp", STATE_FILE)
 
 
 def save_data(balance, warehouse, operations):
-    """Save current program state to file."""
+    """Save current program state to file.
+
+    New operations are appended to the operations file first; the state file
+    is then replaced atomically, so a crash in between leaves the previous
+    save intact.
+    """
     try:
-        data = {
-            "balance": balance,
-            "warehouse": warehouse,
-            "operations": operations,
-        }
-        with open(DATA_FILE, "w") as file:
-            file.write(str(data))
+        operations.write_pending()
+        write_state(balance, warehouse, operations)
         print("Data saved successfully.")
     except Exception as e:
         print(f"Error saving data: {e}")
 
 
+def record_operation(balance, warehouse, operations, op):
+    """Append an operation to the log durably; checkpoint the state every CHECKPOINT_EVERY operations.
+
+    `balance` and `warehouse` must already include the operation.
+    """
+    operations.append(op)
+    try:
+        operations.write_pending()
+        if len(operations) % CHECKPOINT_EVERY == 0:
+            write_state(balance, warehouse, operations)
+    except Exception as e:
+        print(f"Error autosaving data: {e}")
+
+
 def main():
     account_balance, warehouse, operations = load_data()
     show_commands()
@@ -67,7 +169,7 @@ def main():
                 amount = float(input("Enter amount to add/subtract (use negative for subtraction): "))
                 comment = input("Comment: ")
                 account_balance += amount
-                operations.append({'command': 'balance', 'amount': amount, 'comment': comment})
+                record_operation(account_balance, warehouse, operations, {'command': 'balance', 'amount': amount, 'comment': comment})
             except ValueError:
                 print("Invalid amount. Please enter a numeric value.")
 
@@ -80,7 +182,7 @@ def main():
                 if product in warehouse and warehouse[product]['quantity'] >= quantity:
                     warehouse[product]['quantity'] -= quantity
                     account_balance += price * quantity
-                    operations.append({'command': 'sale', 'product': product, 'price': price, 'quantity': quantity})
+                    record_operation(account_balance, warehouse, operations, {'command': 'sale', 'product': product, 'price': price, 'quantity': quantity})
                 else:
                     print("Not enough inventory to complete the sale.")
             except ValueError:
@@ -102,7 +204,7 @@ def main():
                     else:
                         warehouse[product] = {'price': price, 'quantity': quantity}
                     account_balance -= total_cost
-                    operations.append({'command': 'purchase', 'product': product, 'price': price, 'quantity': quantity})
+                    record_operation(account_balance, warehouse, operations, {'command': 'purchase', 'product': product, 'price': price, 'quantity': quantity})
             except ValueError:
                 print("Invalid input. Please enter numeric values for price and quantity.")
 
@@ -140,6 +242,34 @@ def main():
             except ValueError:
                 print("Invalid indices. Please enter integer values or leave blank.")
 
+        elif command == "by-product":
+            product = input("Product name: ").strip()
+            totals = operations.product_totals(product)
+            if totals is None:
+                print("No operations found for this product.")
+            else:
+                print_operations(operations, operations.indices_for_product(product))
+                print(f"Sold {totals['units_sold']} units in {totals['sales']} sales for {totals['revenue']:.2f}; "
+                      f"purchased {totals['units_purchased']} units in {totals['purchases']} purchases "
+                      f"for {totals['spent']:.2f}.")
+
+        elif command == "by-type":
+            op_type = input("Operation type (balance/sale/purchase): ").strip().lower()
+            if op_type in ("balance", "sale", "purchase"):
+                print_operations(operations, operations.indices_for_command(op_type))
+            else:
+                print("Unknown operation type.")
+
+        elif command == "by-amount":
+            try:
+                low_input = input("Minimum amount (leave empty for no minimum): ").strip()
+                high_input = input("Maximum amount (leave empty for no maximum): ").strip()
+                low = float(low_input) if low_input else float("-inf")
+                high = float(high_input) if high_input else float("inf")
+                print_operations(operations, operations.indices_for_amount(low, high))
+            except ValueError:
+                print("Invalid amount. Please enter numeric values or leave blank.")
+
         elif command == "end":
             save_data(account_balance, warehouse, operations)
             print("Program terminated. Data saved.")
@@ -1,10 +1,46 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, stream_template
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from werkzeug.http import is_resource_modified
+import csv
+import functools
+import hashlib
+import io
+import json
 import os
 import ast
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialised
+    fcntl = None
 
 app = Flask(__name__)
 DATA_FILE = "data.txt"
 
+# Storage mode: "journal" appends each operation to JOURNAL_FILE and keeps
+# balance/warehouse in SNAPSHOT_FILE; "text" rewrites DATA_FILE on every save.
+STORAGE_MODE = os.environ.get("WAREHOUSE_STORAGE", "journal")
+JOURNAL_FILE = "journal.txt"
+SNAPSHOT_FILE = "snapshot.txt"
+INDEX_FILE = "journal.idx"  # start byte offset of every journal line
+SNAPSHOT_EVERY = 1000  # operations between snapshots
+LOCK_FILE = "data.lock"
+GROUP_COMMIT_WINDOW = 0.002  # seconds a commit waits for more writes to batch
+
+PAGE_CACHE_SECONDS = 5  # how long a rendered page may be reused
+PAGE_CACHE_MAX_ENTRIES = 256
+EXPORT_FIELDS = ("type", "operation", "product", "price", "quantity", "total")
+EXPORT_CHUNK_BYTES = 64 * 1024  # response chunk size for exports
+
+# Parsed state shared by requests in this process as (file signatures, data)
+_state_cache = {"entry": None}
+_journal_ready = {"done": False}  # the data.txt import has been checked for
+cache_stats = {"hits": 0, "misses": 0}
+
 # Load data from file
 def load_data():
     if not os.path.exists(DATA_FILE):
@@ -19,63 +55,420 @@ def load_data():
         print("Error reading data file:", e)
         return {"balance": 0.0, "warehouse": {}, "operations": []}
 
-# Save data to file
+# Save data to file; readers see either the old or the new file, never half
 def save_data(data):
     try:
-        with open(DATA_FILE, "w") as f:
+        tmp_file = DATA_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
             f.write(str(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, DATA_FILE)
+        remember_state(data)
     except Exception as e:
         print("Error writing to data file:", e)
+        invalidate_state()
+
+# Identify a file version without reading it
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def state_signature():
+    if STORAGE_MODE == "journal":
+        ensure_journal()
+        return (file_signature(SNAPSHOT_FILE), file_signature(JOURNAL_FILE))
+    return file_signature(DATA_FILE)
+
+# Cache data as the current on-disk state after this process wrote it
+def remember_state(data, key=None):
+    _state_cache["entry"] = (key or state_signature(), data)
+
+def invalidate_state():
+    _state_cache["entry"] = None
+
+# Copy the state so writers never mutate a dict that readers may be using
+def copy_state(data):
+    copied = dict(data)
+    copied["warehouse"] = {name: dict(item) for name, item in data["warehouse"].items()}
+    if "operations" in data:
+        copied["operations"] = list(data["operations"])
+    return copied
+
+# Exclusive lock over the data files, shared by threads and worker processes.
+# Re-entrant within a thread so locked helpers can call each other.
+_thread_lock = threading.RLock()
+_lock_holder = {"depth": 0, "file": None}
+
+@contextmanager
+def storage_lock():
+    with _thread_lock:
+        if _lock_holder["depth"] == 0 and fcntl is not None:
+            _lock_holder["file"] = open(LOCK_FILE, "a")
+            fcntl.flock(_lock_holder["file"], fcntl.LOCK_EX)
+        _lock_holder["depth"] += 1
+        try:
+            yield
+        finally:
+            _lock_holder["depth"] -= 1
+            if _lock_holder["depth"] == 0 and _lock_holder["file"] is not None:
+                fcntl.flock(_lock_holder["file"], fcntl.LOCK_UN)
+                _lock_holder["file"].close()
+                _lock_holder["file"] = None
+
+# Rendered GET pages as (path, etag) -> (expires_at, body); a write changes the
+# etag, so older entries are never served again
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+
+# ETag and modification time of the stored ledger, from file metadata only
+def ledger_version():
+    signature = state_signature()
+    files = signature if STORAGE_MODE == "journal" else (signature,)
+    mtimes = [sig[1] for sig in files if sig is not None]
+    last_modified = datetime.fromtimestamp(max(mtimes) / 1e9, timezone.utc) if mtimes else None
+    return hashlib.sha1(repr(signature).encode()).hexdigest()[:16], last_modified
+
+# Answer GETs with 304 when the client's copy is current, otherwise reuse a
+# recently rendered page when there is one
+def conditional_page(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET":
+            return view(*args, **kwargs)
+
+        etag, last_modified = ledger_version()
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = app.response_class(status=304)
+        else:
+            key = (request.full_path, etag)
+            now = time.monotonic()
+            with _page_cache_lock:
+                cached = _page_cache.get(key)
+            if cached and cached[0] > now:
+                response = app.response_class(cached[1], mimetype="text/html")
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    with _page_cache_lock:
+                        if len(_page_cache) >= PAGE_CACHE_MAX_ENTRIES:
+                            _page_cache.clear()
+                        _page_cache[key] = (now + PAGE_CACHE_SECONDS, response.get_data())
+
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True  # revalidate on every poll
+        return response
+    return wrapper
+
+# Split an operation line into its fields
+def parse_operation(line):
+    kind, rest = line.split(",", 1)
+    if kind == "Balance":
+        operation, amount = rest.split(",")
+        return {"type": kind, "operation": operation, "product": None,
+                "price": None, "quantity": None, "total": float(amount)}
+
+    # Product names may contain commas, the numeric fields never do
+    name, price, quantity, total = rest.rsplit(",", 3)
+    return {"type": kind, "operation": None, "product": name,
+            "price": float(price), "quantity": int(quantity), "total": float(total)}
+
+# Apply one operation line to the in-memory state
+def apply_operation(data, line, check=True):
+    op = parse_operation(line)
+    kind = op["type"]
+    if kind == "Balance":
+        if op["operation"] == "add":
+            data["balance"] += op["total"]
+        elif op["operation"] == "subtract":
+            data["balance"] -= op["total"]
+        else:
+            raise ValueError("Invalid operation")
+        return
+
+    name, price, quantity, total = op["product"], op["price"], op["quantity"], op["total"]
+    warehouse = data["warehouse"]
+    if kind == "Purchase":
+        if check and total > data["balance"]:
+            raise ValueError("Insufficient funds")
+        if name in warehouse:
+            warehouse[name]["quantity"] += quantity
+            warehouse[name]["price"] = price
+        else:
+            warehouse[name] = {"price": price, "quantity": quantity}
+        data["balance"] -= total
+    elif kind == "Sale":
+        if check and (name not in warehouse or warehouse[name]["quantity"] < quantity):
+            raise ValueError("Not enough stock to sell")
+        warehouse[name]["quantity"] -= quantity
+        data["balance"] += total
+    else:
+        raise ValueError(f"Unknown operation: {kind}")
+
+# Write the snapshot through a temp file so a crash never leaves half of it
+def save_snapshot(data):
+    snapshot = {
+        "balance": data["balance"],
+        "warehouse": data["warehouse"],
+        "journal_offset": data["journal_offset"],
+        "operation_count": data["operation_count"],
+    }
+    tmp_file = SNAPSHOT_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write(str(snapshot))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, SNAPSHOT_FILE)
+
+# Seed the journal and snapshot from an existing text database
+def import_text_data():
+    data = load_data()
+    with open(JOURNAL_FILE, "wb") as f:
+        for line in data["operations"]:
+            f.write((line + "\n").encode())
+        data["journal_offset"] = f.tell()
+    data["operation_count"] = len(data["operations"])
+    save_snapshot(data)
+
+# Import an existing text database the first time journal storage runs
+# without a journal; every journal reader goes through this first
+def ensure_journal():
+    if _journal_ready["done"]:
+        return
+    if not os.path.exists(SNAPSHOT_FILE) and not os.path.exists(JOURNAL_FILE) and os.path.exists(DATA_FILE):
+        with storage_lock():
+            if not os.path.exists(SNAPSHOT_FILE) and not os.path.exists(JOURNAL_FILE):
+                import_text_data()
+    _journal_ready["done"] = os.path.exists(SNAPSHOT_FILE) or os.path.exists(JOURNAL_FILE)
+
+# Load balance and warehouse from the latest snapshot plus journal replay
+def load_journal_state():
+    ensure_journal()
+    data = {"balance": 0.0, "warehouse": {}, "journal_offset": 0, "operation_count": 0}
+    if os.path.exists(SNAPSHOT_FILE):
+        with open(SNAPSHOT_FILE, "r") as f:
+            data.update(ast.literal_eval(f.read()))
+
+    if not os.path.exists(JOURNAL_FILE):
+        return data
+    with open(JOURNAL_FILE, "rb") as f:
+        f.seek(data["journal_offset"])
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # still being written, or torn by a crash
+            apply_operation(data, raw.decode().rstrip("\n"), check=False)
+            data["journal_offset"] += len(raw)
+            data["operation_count"] += 1
+    return data
+
+# Yield every complete journalled operation line in order
+def read_journal():
+    ensure_journal()
+    if not os.path.exists(JOURNAL_FILE):
+        return
+    with open(JOURNAL_FILE, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # still being written, or torn by a crash
+            yield raw.decode().rstrip("\n")
+
+# Read the journal offset stored for one line number
+def read_index_entry(idx, line_number):
+    entry = array("Q")
+    idx.seek(line_number * entry.itemsize)
+    entry.fromfile(idx, 1)
+    return entry[0]
+
+# Extend the offset index to cover every complete journal line and
+# return the number of indexed lines; only the unindexed tail is scanned
+def update_journal_index():
+    ensure_journal()
+    with storage_lock():
+        return extend_journal_index()
+
+def extend_journal_index():
+    journal_size = os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0
+    new_offsets = array("Q")
+    with open(INDEX_FILE, "a+b") as idx:
+        count = idx.seek(0, os.SEEK_END) // new_offsets.itemsize
+        # Entries past the journal end belong to a torn write that was truncated
+        while count and read_index_entry(idx, count - 1) >= journal_size:
+            count -= 1
+
+        position = read_index_entry(idx, count - 1) if count else 0
+        if position < journal_size:
+            with open(JOURNAL_FILE, "rb") as f:
+                f.seek(position)
+                if count:
+                    position += len(f.readline())
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    new_offsets.append(position)
+                    position += len(raw)
+
+        idx.truncate(count * new_offsets.itemsize)
+        new_offsets.tofile(idx)
+    return count + len(new_offsets)
+
+# Read operation lines [line_from, line_to) using the offset index
+def read_journal_page(line_from, line_to):
+    count = update_journal_index()
+    line_to = min(line_to, count)
+    if line_from >= line_to:
+        return []
+
+    with open(INDEX_FILE, "rb") as idx:
+        start = read_index_entry(idx, line_from)
+    with open(JOURNAL_FILE, "rb") as f:
+        f.seek(start)
+        return [f.readline().decode().rstrip("\n") for _ in range(line_to - line_from)]
+
+# Record where new journal lines start if the index is otherwise current
+def append_index_entries(offsets, line_number):
+    offsets = array("Q", offsets)
+    if os.path.exists(INDEX_FILE) and os.path.getsize(INDEX_FILE) == line_number * offsets.itemsize:
+        with open(INDEX_FILE, "ab") as idx:
+            offsets.tofile(idx)
+
+# Load balance, warehouse and operations for the configured storage mode,
+# re-parsing only when the files changed since the cached copy was taken.
+# The returned state is shared and must not be mutated.
+def load_state():
+    key = state_signature()
+    entry = _state_cache["entry"]
+    if entry is not None and entry[0] == key:
+        cache_stats["hits"] += 1
+        return entry[1]
+
+    cache_stats["misses"] += 1
+    if STORAGE_MODE == "journal":
+        data = load_journal_state()
+    else:
+        data = load_data()
+    remember_state(data, key)
+    return data
+
+# Persist operations that have already been applied to data; the caller
+# holds storage_lock()
+def record_operations(data, lines):
+    if STORAGE_MODE != "journal":
+        data["operations"].extend(lines)
+        save_data(data)
+        return
+
+    try:
+        with open(JOURNAL_FILE, "ab") as f:
+            # Bytes past the replayed state are a torn write from a crash
+            if f.tell() > data["journal_offset"]:
+                f.truncate(data["journal_offset"])
+            starts = []
+            position = data["journal_offset"]
+            payload = []
+            for line in lines:
+                raw = (line + "\n").encode()
+                starts.append(position)
+                payload.append(raw)
+                position += len(raw)
+            f.write(b"".join(payload))
+            f.flush()
+            os.fsync(f.fileno())
+            data["journal_offset"] = position
+        append_index_entries(starts, data["operation_count"])
+        snapshots_before = data["operation_count"] // SNAPSHOT_EVERY
+        data["operation_count"] += len(lines)
+        if data["operation_count"] // SNAPSHOT_EVERY > snapshots_before:
+            save_snapshot(data)
+    except Exception:
+        invalidate_state()
+        raise
+    remember_state(data)
+
+# Apply a batch of queued operations under one lock and one write
+def commit_batch(batch):
+    try:
+        with storage_lock():
+            data = copy_state(load_state())
+            lines = []
+            for entry in batch:
+                try:
+                    apply_operation(data, entry["line"])
+                    lines.append(entry["line"])
+                except ValueError as e:
+                    entry["error"] = e
+            if lines:
+                record_operations(data, lines)
+    except Exception as e:
+        for entry in batch:
+            if entry["error"] is None:
+                entry["error"] = e
+    finally:
+        for entry in batch:
+            entry["done"].set()
+
+# Group commit: the first waiting request collects the operations that
+# arrive within GROUP_COMMIT_WINDOW and commits them for everyone
+_pending = []
+_pending_lock = threading.Lock()
+
+def submit_operation(line):
+    entry = {"line": line, "error": None, "done": threading.Event()}
+    with _pending_lock:
+        _pending.append(entry)
+        leader = len(_pending) == 1
+
+    if leader:
+        time.sleep(GROUP_COMMIT_WINDOW)
+        with _pending_lock:
+            batch = _pending[:]
+            _pending.clear()
+        commit_batch(batch)
+    else:
+        entry["done"].wait()
+
+    if entry["error"] is not None:
+        raise entry["error"]
 
 # Main page route
 @app.route("/", methods=["GET", "POST"])
+@conditional_page
 def index():
-    data = load_data()
+    data = load_state()
     error = None
 
     if request.method == "POST":
         form_type = request.form.get("form_type")
         try:
+            line = None
             # PURCHASE FORM
             if form_type == "purchase":
                 name = request.form["purchaseName"]
                 price = float(request.form["purchasePrice"])
                 quantity = int(request.form["purchaseQuantity"])
-                total_cost = price * quantity
-                if total_cost > data["balance"]:
-                    raise ValueError("Insufficient funds")
-                if name in data["warehouse"]:
-                    data["warehouse"][name]["quantity"] += quantity
-                    data["warehouse"][name]["price"] = price
-                else:
-                    data["warehouse"][name] = {"price": price, "quantity": quantity}
-                data["balance"] -= total_cost
-                data["operations"].append(f"Purchase,{name},{price},{quantity},{total_cost}")
+                line = f"Purchase,{name},{price},{quantity},{price * quantity}"
 
             # SALE FORM
             elif form_type == "sale":
                 name = request.form["saleName"]
                 price = float(request.form["salePrice"])
                 quantity = int(request.form["saleQuantity"])
-                if name not in data["warehouse"] or data["warehouse"][name]["quantity"] < quantity:
-                    raise ValueError("Not enough stock to sell")
-                data["warehouse"][name]["quantity"] -= quantity
-                data["balance"] += price * quantity
-                data["operations"].append(f"Sale,{name},{price},{quantity},{price*quantity}")
+                line = f"Sale,{name},{price},{quantity},{price * quantity}"
 
             # BALANCE CHANGE FORM
             elif form_type == "balance":
                 operation = request.form["operationType"]
                 amount = float(request.form["balanceAmount"])
-                if operation == "add":
-                    data["balance"] += amount
-                elif operation == "subtract":
-                    data["balance"] -= amount
-                else:
-                    raise ValueError("Invalid operation")
-                data["operations"].append(f"Balance,{operation},{amount}")
-
-            save_data(data)
+                line = f"Balance,{operation},{amount}"
+
+            if line is not None:
+                if "\n" in line or "\r" in line:
+                    raise ValueError("Operation must fit on a single line")
+                submit_operation(line)
             return redirect(url_for("index"))
 
         except Exception as e:
@@ -89,14 +482,58 @@ def index():
 # History page route
 @app.route("/history/")
 @app.route("/history/<int:line_from>/<int:line_to>/")
+@conditional_page
 def history(line_from=None, line_to=None):
-    data = load_data()
-    operations = data["operations"]
-
     if line_from is not None and line_to is not None:
-        operations = operations[line_from:line_to]
+        if STORAGE_MODE == "journal":
+            operations = read_journal_page(line_from, line_to)
+        else:
+            operations = load_state()["operations"][line_from:line_to]
+        return render_template("history.html", history=operations)
+
+    # The full ledger is rendered while it is read instead of held in memory
+    if STORAGE_MODE == "journal":
+        operations = read_journal()
+    else:
+        operations = load_state()["operations"]
+    return Response(stream_template("history.html", history=operations))
+
+# Stream operations as CSV or NDJSON chunks without collecting them first
+def export_chunks(operations, fmt, kind=None, product=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(EXPORT_FIELDS)
+    for line in operations:
+        op = parse_operation(line)
+        if (kind is not None and op["type"] != kind) or (product is not None and op["product"] != product):
+            continue
+        if fmt == "csv":
+            writer.writerow(["" if op[field] is None else op[field] for field in EXPORT_FIELDS])
+        else:
+            buffer.write(json.dumps(op) + "\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+# Full ledger export, e.g. /export/operations.csv?type=Sale&product=Apple
+@app.route("/export/operations.<any(csv, ndjson):fmt>")
+def export_operations(fmt):
+    if STORAGE_MODE == "journal":
+        operations = read_journal()
+    else:
+        operations = load_state()["operations"]
+    chunks = export_chunks(operations, fmt, request.args.get("type"), request.args.get("product"))
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(chunks, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=operations.{fmt}"})
 
-    return render_template("history.html", history=operations)
+# State cache counters
+@app.route("/cache/")
+def cache():
+    return jsonify(cache_stats)
 
 # Run the Flask app
 if __name__ == "__main__":
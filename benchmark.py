@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Latency and throughput benchmark for both Flask warehouse backends.
+
+Seeds a synthetic ledger of the requested size into a scratch directory,
+then drives the index forms and history routes through the Flask test
+client from several threads and prints one JSON report per run.
+
+Example:
+    python benchmark.py --ledger-size 100000 --requests 500 --concurrency 8 --output bench.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TEXT_APP = os.path.join(ROOT, "Warehouse Accounting", "App.py")
+SQL_APP = os.path.join(ROOT, "SQLAlchemy - app", "app.py")
+PRODUCTS = 50
+
+
+# ------------------------------ Helpers ------------------------------
+def load_app(module_name, path):
+    """Import an app module from its file path."""
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module  # Flask finds the app's root path through it
+    spec.loader.exec_module(module)
+    # Both apps keep their templates in "Templates", which Flask's default
+    # "templates" only finds on case-insensitive file systems
+    module.app.template_folder = "Templates"
+    return module
+
+
+def synthetic_operations(size, seed=0):
+    """Yield (kind, product, price, quantity) tuples that always stay valid."""
+    rng = random.Random(seed)
+    for i in range(PRODUCTS):
+        yield "purchase", f"Product {i}", 1.0, size + 1000
+    for _ in range(size - PRODUCTS):
+        kind = "sale" if rng.random() < 0.6 else "purchase"
+        yield kind, f"Product {rng.randrange(PRODUCTS)}", round(rng.uniform(1, 20), 2), rng.randint(1, 3)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def form_for(kind, product, price, quantity):
+    prefix = "purchase" if kind == "purchase" else "sale"
+    return {"form_type": kind, f"{prefix}Name": product,
+            f"{prefix}Price": str(price), f"{prefix}Quantity": str(quantity)}
+
+
+# ------------------------------ Seeding ------------------------------
+def seed_text_app(module, size):
+    """Write the synthetic ledger straight into the text app's storage files."""
+    data = {"balance": 0.0, "warehouse": {}, "operations": []}
+    lines = ["Balance,add,1000000000.0"]
+    for kind, product, price, quantity in synthetic_operations(size - 1):
+        lines.append(f"{kind.capitalize()},{product},{float(price)},{quantity},{price * quantity}")
+    for line in lines:
+        module.apply_operation(data, line, check=False)
+
+    if module.STORAGE_MODE == "journal":
+        with open(module.JOURNAL_FILE, "wb") as f:
+            f.write("".join(line + "\n" for line in lines).encode())
+            data["journal_offset"] = f.tell()
+        data["operation_count"] = len(lines)
+        del data["operations"]
+        module.save_snapshot(data)
+    else:
+        data["operations"] = lines
+        module.save_data(data)
+
+
+def seed_sql_app(module, size):
+    """Load the synthetic ledger through the batch ingestion endpoint."""
+    client = module.app.test_client()
+    operations = [{"type": "balance", "operation": "add", "amount": 1e9}]
+    for kind, product, price, quantity in synthetic_operations(size - 1):
+        operations.append({"type": kind, "name": product, "price": price, "quantity": quantity})
+    for start in range(0, len(operations), module.BATCH_MAX_OPERATIONS):
+        response = client.post("/api/transactions/batch",
+                               json=operations[start:start + module.BATCH_MAX_OPERATIONS])
+        if response.status_code != 200 or response.json["rejected"]:
+            raise RuntimeError(f"Seeding failed: {response.status_code} {response.get_data(as_text=True)[:200]}")
+
+
+# ------------------------------ Load generation ------------------------------
+def routes_for(backend, size):
+    """Return (name, request builder, expected status) for each benchmarked route."""
+    def sale(rng):
+        return "post", "/", form_for("sale", f"Product {rng.randrange(PRODUCTS)}", 5.0, 1)
+
+    def purchase(rng):
+        return "post", "/", form_for("purchase", f"Product {rng.randrange(PRODUCTS)}", 1.0, 1)
+
+    def page(rng):
+        start = rng.randrange(max(size - 50, 1))
+        return "get", f"/history/{start}/{start + 50}/", None
+
+    routes = [
+        ("GET /", lambda rng: ("get", "/", None), 200),
+        ("POST / sale", sale, 302),
+        ("POST / purchase", purchase, 302),
+        ("GET /history/", lambda rng: ("get", "/history/", None), 200),
+        ("GET /history/<from>/<to>/", page, 200),
+    ]
+    if backend == "sqlalchemy":
+        routes.append(("GET /history/?after=<id>",
+                       lambda rng: ("get", f"/history/?after={rng.randrange(size)}", None), 200))
+    return routes
+
+
+def run_route(app, build, expected_status, requests, concurrency):
+    """Send requests from concurrent threads and summarise their latencies."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count, seed):
+        client = app.test_client()
+        rng = random.Random(seed)
+        local, failed = [], 0
+        for _ in range(count):
+            method, url, form = build(rng)
+            started = time.perf_counter()
+            response = client.post(url, data=form) if method == "post" else client.get(url)
+            response.get_data()  # drain streamed bodies
+            local.append(time.perf_counter() - started)
+            failed += response.status_code != expected_status
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(count, i)) for i, count in enumerate(per_thread)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def benchmark_backend(backend, args):
+    """Seed a scratch copy of one backend and measure every route."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{backend}-")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # the text app keeps its files relative to the cwd
+    try:
+        if backend == "text":
+            os.environ["WAREHOUSE_STORAGE"] = args.text_storage
+            module = load_app("bench_text_app", TEXT_APP)
+            seed = seed_text_app
+        else:
+            os.environ["WAREHOUSE_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+            module = load_app("bench_sql_app", SQL_APP)
+            seed = seed_sql_app
+        # With the rendered-page cache on, GET routes mostly measure cache hits
+        module.PAGE_CACHE_SECONDS = args.page_cache_seconds
+
+        started = time.perf_counter()
+        seed(module, args.ledger_size)
+        seed_seconds = time.perf_counter() - started
+
+        results = {}
+        for name, build, expected_status in routes_for(backend, args.ledger_size):
+            if args.routes and not any(part in name for part in args.routes):
+                continue
+            results[name] = run_route(module.app, build, expected_status, args.requests, args.concurrency)
+            print(f"{backend:>10}  {name:<28} {results[name]}", file=sys.stderr)
+        return {
+            "backend": backend,
+            "storage": args.text_storage if backend == "text" else "sqlite",
+            "seed_seconds": round(seed_seconds, 3),
+            "routes": results,
+        }
+    finally:
+        os.chdir(previous_cwd)
+
+
+# ------------------------------ Main Program ------------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["text", "sqlalchemy", "both"], default="both")
+    parser.add_argument("--text-storage", choices=["journal", "text"], default="journal",
+                        help="storage mode of the text backend")
+    parser.add_argument("--ledger-size", type=int, default=10000, help="operations seeded before measuring")
+    parser.add_argument("--requests", type=int, default=200, help="requests sent per route")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads per route")
+    parser.add_argument("--page-cache-seconds", type=float, default=0,
+                        help="lifetime of the apps' rendered-page cache (default 0: every request renders)")
+    parser.add_argument("--routes", nargs="*", help="only run routes whose name contains one of these")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    backends = ["text", "sqlalchemy"] if args.backend == "both" else [args.backend]
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "ledger_size": args.ledger_size,
+        "requests_per_route": args.requests,
+        "concurrency": args.concurrency,
+        "page_cache_seconds": args.page_cache_seconds,
+        "results": [benchmark_backend(backend, args) for backend in backends],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Row-offset index and memory-mapped row access for CSV files."""
+import csv
+import io
+import locale
+import mmap
+import os
+import re
+import struct
+from array import array
+
+INDEX_SUFFIX = '.rowidx'
+INDEX_MAGIC = b'CSVROWS2'  # bumped when the boundary rules change, so old sidecars are rebuilt
+INDEX_HEADER = struct.Struct('<8sQqQ')  # magic, source size, source mtime_ns, row count
+INDEX_BLOCK_SIZE = 1 << 20  # bytes scanned at a time while building the index
+
+# One record of the csv module's default dialect. A field is quoted only
+# if it starts with a quote; inside it "" is an escaped quote, and whatever
+# follows the closing quote up to the delimiter is literal text. Elsewhere a
+# quote is an ordinary character. Written so every complete record matches in
+# exactly one way, which keeps backtracking linear.
+_FIELD = rb'(?:"[^"]*(?:""[^"]*)*"(?:[^,\n"][^,\n]*)?|[^,\n"][^,\n]*|)'
+_RECORD = re.compile(_FIELD + rb'(?:,' + _FIELD + rb')*\n')
+_RECORDS = re.compile(rb'(?:' + _RECORD.pattern + rb')*')
+
+
+def iter_record_ends(f, min_length=0, block_size=INDEX_BLOCK_SIZE):
+    """Yield the offset just past every newline of binary file `f` that ends a record.
+
+    A newline inside a quoted field does not end a record, and a quote that
+    does not start a field is a literal character, as for csv.reader. With
+    `min_length`, only the first end at least that many bytes after the
+    previously yielded one is reported; the records in between are skipped
+    in a single regex match.
+    """
+    base = 0          # file offset of buf[0]
+    last = 0          # offset last yielded
+    buf = b''
+    read_size = block_size
+    while True:
+        block = f.read(read_size)
+        buf += block
+        pos = 0
+        while True:
+            if min_length > 1:
+                pos = _RECORDS.match(buf, pos, max(pos, last + min_length - 1 - base)).end()
+            match = _RECORD.match(buf, pos)
+            if match is None:
+                break
+            pos = match.end()
+            last = base + pos
+            yield last
+        if not block:
+            return
+        # A record longer than the buffer: read more at a time instead of
+        # rescanning it for every block
+        read_size = block_size if pos else read_size * 2
+        base += pos
+        buf = buf[pos:]
+
+
+class CSVRowIndex:
+    """Byte offsets of every record of a CSV file, kept in a sidecar file.
+
+    The sidecar (`<src>.rowidx`) is rebuilt in one pass whenever the source's
+    size or modification time no longer match, and reused otherwise. Rows are
+    then read straight from a memory map of the source, so reaching row Y
+    does not parse the rows before it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.encoding = locale.getpreferredencoding(False)  # what open() uses for the CSV itself
+        stat = os.stat(path)
+        self.signature = (stat.st_size, stat.st_mtime_ns)
+        self.offsets = self._load() or self._build()
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    # ------ Sidecar ------
+    def _load(self):
+        """Return the cached offsets if the sidecar matches the source, else None."""
+        try:
+            with open(self.path + INDEX_SUFFIX, 'rb') as f:
+                magic, size, mtime_ns, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC or (size, mtime_ns) != self.signature:
+                    return None
+                offsets = array('Q')
+                offsets.fromfile(f, count + 1)
+                return offsets
+        except (OSError, struct.error, EOFError):
+            return None
+
+    def _build(self):
+        """Scan the source once for record starts and save them to the sidecar."""
+        offsets = array('Q', [0])
+        size = self.signature[0]
+        with open(self.path, 'rb') as f:
+            offsets.extend(iter_record_ends(f))
+        if offsets[-1] != size:
+            offsets.append(size)  # last record without a trailing newline
+
+        try:
+            with open(self.path + INDEX_SUFFIX + '.tmp', 'wb') as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, size, self.signature[1], len(offsets) - 1))
+                offsets.tofile(f)
+            os.replace(self.path + INDEX_SUFFIX + '.tmp', self.path + INDEX_SUFFIX)
+        except OSError:
+            pass  # read-only location: the index just is not cached
+        return offsets
+
+    # ------ Row access ------
+    def row_bytes(self, y):
+        """Raw bytes of row `y`, including its line terminator."""
+        return self._map[self.offsets[y]:self.offsets[y + 1]]
+
+    def row(self, y):
+        """Parse and return row `y` as a list of strings."""
+        if y < 0 or y >= len(self):
+            raise IndexError(f"row {y} out of range")
+        text = self.row_bytes(y).decode(self.encoding)
+        return next(csv.reader(io.StringIO(text, newline='')), [])
+
+    def write_patched(self, dst, rows):
+        """Copy the source to `dst`, replacing the rows in `rows` ({y: fields}).
+
+        Unchanged rows are copied byte for byte; only replaced rows are
+        serialized again, keeping the line terminator of the row they
+        replace (none for a final row without one). Unchanged ranges are
+        copied a block at a time, so memory use does not grow with the file.
+        The copy is written next to `dst` and moved into place, so `dst` may
+        be the source itself.
+        """
+        with open(dst + '.tmp', 'wb') as f:
+            position = 0
+            for y in sorted(rows):
+                start = self.offsets[y]
+                self._copy_range(f, position, start)
+                original = self.row_bytes(y)
+                terminator = '\r\n' if original.endswith(b'\r\n') else '\n' if original.endswith(b'\n') else ''
+                out = io.StringIO(newline='')
+                csv.writer(out, lineterminator='\n').writerow(rows[y])
+                f.write((out.getvalue()[:-1] + terminator).encode(self.encoding))
+                position = self.offsets[y + 1]
+            self._copy_range(f, position, self.signature[0])
+        os.replace(dst + '.tmp', dst)
+
+    def _copy_range(self, f, start, end):
+        """Write source bytes [start, end) to `f` in INDEX_BLOCK_SIZE blocks."""
+        # Read through the file rather than the map: touched map pages would
+        # stay resident for the whole copy
+        self._file.seek(start)
+        while start < end:
+            block = self._file.read(min(INDEX_BLOCK_SIZE, end - start))
+            if not block:
+                break
+            f.write(block)
+            start += len(block)
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 import sys
 import os
+import bisect
 import csv
+import io
 import json
+import multiprocessing
 import pickle
+import struct
+from array import array
+
+from csv_row_index import CSVRowIndex, iter_record_ends
+
+JSON_CHUNK_SIZE = 1 << 16  # characters read at a time when streaming JSON
+PARALLEL_CHUNK_BYTES = 16 << 20  # nominal size of the CSV chunks handed to each worker
 
 # ------------------------------ Base Class ------------------------------
 class FileHandler:
@@ -22,30 +32,63 @@ class FileHandler:
         """Write data to file."""
         raise NotImplementedError
 
-    def display(self):
-        """Display the data in a readable format."""
+    def iter_rows(self):
+        """Yield rows from the source file one at a time.
+
+        Formats that cannot be parsed incrementally fall back to read().
+        """
+        self.read()
+        yield from self.data
+
+    def write_rows(self, rows):
+        """Write an iterable of rows to the destination file."""
+        self.data = list(rows)
+        self.write()
+
+    def display_rows(self, rows):
+        """Print rows as they stream past and pass them on unchanged."""
         print("\nModified File Content:")
-        for row in self.data:
+        for row in rows:
             print(','.join(map(str, row)))
+            yield row
 
-    def apply_changes(self, changes):
-        """Apply changes provided as 'X,Y,value'."""
+    def changed_rows(self, rows, changes):
+        """Apply 'X,Y,value' changes to a row stream without holding it in memory."""
+        by_row = self.group_changes(changes)
+        yield from self.apply_row_changes(rows, by_row)
+        for y in sorted(by_row):
+            print(f"Warning: Row index {y} out of range. Skipping.")
+
+    def group_changes(self, changes):
+        """Parse 'X,Y,value' changes into {Y: [(X, value), ...]}."""
+        by_row = {}
         for change in changes:
             try:
                 x_str, y_str, value = change.split(',', 2)
                 x = int(x_str.strip())
                 y = int(y_str.strip())
+            except ValueError:
+                print(f"Invalid change format: '{change}'. Expected format 'X,Y,value'. Skipping.")
+                continue
+            if y < 0:
+                print(f"Warning: Row index {y} out of range. Skipping.")
+                continue
+            by_row.setdefault(y, []).append((x, value))
+        return by_row
 
-                if y < 0 or y >= len(self.data):
-                    print(f"Warning: Row index {y} out of range. Skipping.")
-                    continue
-                if x < 0 or x >= len(self.data[y]):
+    def apply_row_changes(self, rows, by_row, first_row=0):
+        """Apply grouped changes to rows numbered from `first_row`.
+
+        Applied entries are removed from `by_row`, so whatever is left
+        afterwards addressed rows the stream did not contain.
+        """
+        for y, row in enumerate(rows, start=first_row):
+            for x, value in by_row.pop(y, ()):
+                if x < 0 or x >= len(row):
                     print(f"Warning: Column index {x} out of range in row {y}. Skipping.")
                     continue
-
-                self.data[y][x] = value
-            except ValueError:
-                print(f"Invalid change format: '{change}'. Expected format 'X,Y,value'. Skipping.")
+                row[x] = value
+            yield row
 
 # ------------------------------ CSV Handler ------------------------------
 class CSVHandler(FileHandler):
@@ -59,6 +102,45 @@ class CSVHandler(FileHandler):
             writer = csv.writer(f)
             writer.writerows(self.data)
 
+    def iter_rows(self):
+        with open(self.src, 'r', newline='') as f:
+            yield from csv.reader(f)
+
+    def write_rows(self, rows):
+        # Rows may still be streaming from dst itself, so replace it only at the end
+        with open(self.dst + '.tmp', 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        os.replace(self.dst + '.tmp', self.dst)
+
+    def write_indexed_changes(self, changes):
+        """Copy src to dst applying changes through the row index; return {Y: changed row}.
+
+        Only the changed rows are parsed and re-serialized; everything else is
+        copied byte for byte, so a few edits in a huge file cost one copy.
+        """
+        by_row = self.group_changes(changes)
+        changed = {}
+        with CSVRowIndex(self.src) as index:
+            for y in sorted(by_row):
+                if y < len(index):
+                    changed[y] = next(self.apply_row_changes([index.row(y)], by_row, first_row=y))
+            index.write_patched(self.dst, changed)
+        for y in sorted(by_row):
+            print(f"Warning: Row index {y} out of range. Skipping.")
+        return changed
+
+    # CSV output is plain concatenation, see convert_csv_parallel()
+    document_start, fragment_separator, document_end, empty_document = '', '', '', ''
+
+    def write_fragment(self, f, rows):
+        """Write rows as a piece of a larger CSV file; return how many were written."""
+        count = 0
+        writer = csv.writer(f)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+
 # ------------------------------ JSON Handler ------------------------------
 class JSONHandler(FileHandler):
     def read(self):
@@ -69,6 +151,64 @@ class JSONHandler(FileHandler):
         with open(self.dst, 'w') as f:
             json.dump(self.data, f, indent=4)
 
+    def iter_rows(self):
+        """Yield the elements of the top-level JSON array without loading it whole."""
+        decoder = json.JSONDecoder()
+        with open(self.src, 'r') as f:
+            buffer, pos, eof = f.read(JSON_CHUNK_SIZE), 0, False
+            started = False
+            while True:
+                # Skip whitespace and the array punctuation between elements
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                    if buffer[pos] == '[':
+                        if started:
+                            break
+                        started = True
+                    pos += 1
+                if pos == len(buffer) or (not eof and len(buffer) - pos < JSON_CHUNK_SIZE):
+                    if eof:
+                        return
+                    chunk = f.read(JSON_CHUNK_SIZE)
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+                if not started:
+                    raise ValueError("Streaming JSON input must be a top-level array")
+                try:
+                    row, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = f.read(JSON_CHUNK_SIZE)
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+                yield row
+                pos = end
+
+    document_start, fragment_separator, document_end, empty_document = '[\n', ',\n', '\n]', '[]'
+
+    def write_fragment(self, f, rows):
+        """Write rows as comma-separated array elements; return how many were written."""
+        count = 0
+        for row in rows:
+            if count:
+                f.write(',\n')
+            f.write('    ' + json.dumps(row, indent=4).replace('\n', '\n    '))
+            count += 1
+        return count
+
+    def write_rows(self, rows):
+        """Write rows as a JSON array one element at a time, laid out like write()."""
+        # Rows may still be streaming from dst itself, so replace it only at the end
+        with open(self.dst + '.tmp', 'w') as f:
+            separator = '[\n'
+            for row in rows:
+                f.write(separator + '    ' + json.dumps(row, indent=4).replace('\n', '\n    '))
+                separator = ',\n'
+            f.write('[]' if separator == '[\n' else '\n]')
+        os.replace(self.dst + '.tmp', self.dst)
+
 # ------------------------------ Pickle Handler ------------------------------
 class PickleHandler(FileHandler):
     def read(self):
@@ -79,11 +219,248 @@ class PickleHandler(FileHandler):
         with open(self.dst, 'wb') as f:
             pickle.dump(self.data, f)
 
+# ------------------------------ Columnar Handler ------------------------------
+class ColumnarHandler(FileHandler):
+    """Typed, column-oriented binary format (.cols).
+
+    Each column is stored as one block. A column whose cells are all ints,
+    or all floats (or strings that print back identically as one), is packed
+    into a 64-bit array; anything else is dictionary-encoded: a table of
+    distinct values plus one small integer code per cell. Columns of plain
+    strings keep them as text, any other mix (bools, None, nested values)
+    stores each value as JSON so its type survives the round trip.
+
+    The first row is kept in the JSON header rather than in the columns, so
+    a text header row does not stop the data below it from being typed.
+    The header also records every block's type and position, so read() can
+    load just the column indices listed in `columns`.
+    """
+
+    MAGIC = b'COLS1\n'
+
+    def __init__(self, src, dst):
+        super().__init__(src, dst)
+        self.columns = None  # column indices to read, or None for all of them
+
+    def read(self):
+        with open(self.src, 'rb') as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f"'{self.src}' is not a columnar file")
+            (meta_size,) = struct.unpack('<I', f.read(4))
+            meta = json.loads(f.read(meta_size))
+            base = f.tell()
+            swap = meta['byteorder'] != sys.byteorder
+
+            def read_array(offset, typecode, count):
+                f.seek(base + offset)
+                values = array(typecode)
+                values.fromfile(f, count)
+                if swap:
+                    values.byteswap()
+                return values
+
+            wanted = range(len(meta['columns'])) if self.columns is None else self.columns
+            values = []
+            for c in wanted:
+                column = meta['columns'][c]
+                if column['type'] in ('str', 'json'):
+                    lengths = read_array(column['offset'], 'I', column['strings'])
+                    blob = f.read(column['blob_size'])
+                    table, pos = [], 0
+                    for length in lengths:
+                        table.append(blob[pos:pos + length].decode('utf-8'))
+                        pos += length
+                    if column['type'] == 'json':
+                        table = [json.loads(value) for value in table]
+                    codes = read_array(column['offset'] + 4 * len(lengths) + column['blob_size'],
+                                       column['code_type'], column['count'])
+                    values.append(list(map(table.__getitem__, codes)))
+                else:
+                    values.append(read_array(column['offset'], 'q' if column['type'] == 'int' else 'd',
+                                             column['count']).tolist())
+
+            if meta['row_lengths'] is None:
+                self.data = list(map(list, zip(*values))) if values else [[] for _ in range(meta['rows'])]
+            else:
+                # Ragged rows: column c only holds cells of rows longer than c
+                row_lengths = read_array(meta['row_lengths'], 'I', meta['rows'])
+                cells = [iter(column_values) for column_values in values]
+                self.data = [[next(cells[i]) for i, c in enumerate(wanted) if c < length]
+                             for length in row_lengths]
+
+            first_row = meta['first_row']
+            if first_row is not None:
+                if self.columns is not None:
+                    first_row = [first_row[c] for c in wanted if c < len(first_row)]
+                self.data.insert(0, first_row)
+
+    def write(self):
+        # The first row (usually a header) goes into the metadata as JSON
+        first_row = list(self.data[0]) if self.data else None
+        rows = self.data[1:]
+        width = max((len(row) for row in rows), default=0)
+        ragged = any(len(row) != width for row in rows)
+        meta = {'byteorder': sys.byteorder, 'rows': len(rows), 'columns': [], 'row_lengths': None,
+                'first_row': first_row}
+        blocks, offset = [], 0
+        for c in range(width):
+            column, column_blocks = self._encode_column([row[c] for row in rows if len(row) > c])
+            column['offset'] = offset
+            meta['columns'].append(column)
+            blocks.extend(column_blocks)
+            offset += sum(len(block) for block in column_blocks)
+        if ragged:
+            meta['row_lengths'] = offset
+            blocks.append(array('I', map(len, rows)).tobytes())
+
+        try:
+            header = json.dumps(meta).encode()
+        except TypeError as e:
+            raise ValueError(f"Columnar files can only hold JSON-compatible values: {e}")
+        with open(self.dst, 'wb') as f:
+            f.write(self.MAGIC + struct.pack('<I', len(header)) + header)
+            for block in blocks:
+                f.write(block)
+
+    @staticmethod
+    def _encode_column(cells):
+        """Return (column metadata, list of byte blocks) for one column's cells."""
+        for kind, typecode, convert in (('int', 'q', _as_int), ('float', 'd', _as_float)):
+            try:
+                packed = array(typecode, map(convert, cells))
+            except (ValueError, TypeError, OverflowError):
+                continue
+            return {'type': kind, 'count': len(cells)}, [packed.tobytes()]
+
+        kind = 'str' if all(type(cell) is str for cell in cells) else 'json'
+        table, codes_by_value = [], {}
+        codes = []
+        for cell in cells:
+            if kind == 'json':
+                try:
+                    value = json.dumps(cell)
+                except TypeError as e:
+                    raise ValueError(f"Columnar files can only hold JSON-compatible values: {e}")
+            else:
+                value = cell
+            code = codes_by_value.get(value)
+            if code is None:
+                code = codes_by_value[value] = len(table)
+                table.append(value)
+            codes.append(code)
+        code_type = 'B' if len(table) <= 0xFF else 'H' if len(table) <= 0xFFFF else 'I'
+        encoded = [value.encode('utf-8') for value in table]
+        blob = b''.join(encoded)
+        column = {'type': kind, 'count': len(cells), 'strings': len(table),
+                  'blob_size': len(blob), 'code_type': code_type}
+        return column, [array('I', map(len, encoded)).tobytes(), blob, array(code_type, codes).tobytes()]
+
+
+def _as_int(cell):
+    """Cell as an int if it is one, or a string that prints back identically as one."""
+    if type(cell) is int:
+        return cell
+    if type(cell) is str and cell == str(int(cell)):
+        return int(cell)
+    raise ValueError(cell)
+
+
+def _as_float(cell):
+    """Cell as a float if it is one, or a string that prints back identically as one."""
+    if type(cell) is float:
+        return cell
+    if type(cell) is str and cell == repr(float(cell)):
+        return float(cell)
+    raise ValueError(cell)
+
+# ------------------------------ Parallel CSV ------------------------------
+def csv_chunk_ranges(path, chunk_bytes):
+    """Split a CSV file into (start, end) byte ranges that begin on record boundaries.
+
+    Each range runs to the first record boundary at least `chunk_bytes`
+    past its start; boundaries come from iter_record_ends(), which reads
+    quotes the way the csv module does.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        for end in iter_record_ends(f, chunk_bytes):
+            ranges.append((start, end))
+            start = end
+    if start < size:
+        ranges.append((start, size))
+    return ranges
+
+
+def read_csv_chunk(src, start, end):
+    """Return a csv.reader over the records in src[start:end]."""
+    with open(src, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return csv.reader(io.TextIOWrapper(io.BytesIO(data), newline=''))
+
+
+def count_csv_chunk(task):
+    src, start, end = task
+    return sum(1 for _ in read_csv_chunk(src, start, end))
+
+
+def convert_csv_chunk(task):
+    """Worker: convert one chunk; return (row count, text in the writer's format)."""
+    src, start, end, write_handler_class, first_row, by_row = task
+    rows = read_csv_chunk(src, start, end)
+    if by_row:
+        rows = CSVHandler(src, None).apply_row_changes(rows, by_row, first_row)
+    out = io.StringIO(newline='')
+    count = write_handler_class(src, None).write_fragment(out, rows)
+    return count, out.getvalue()
+
+
+def convert_csv_parallel(src, dst, write_handler_class, changes, workers):
+    """Convert a CSV file chunk by chunk in a process pool, writing chunks in order."""
+    ranges = csv_chunk_ranges(src, PARALLEL_CHUNK_BYTES)
+    by_row = CSVHandler(src, dst).group_changes(changes) if changes else {}
+    with multiprocessing.Pool(workers) as pool:
+        first_rows = [0] * len(ranges)
+        chunk_changes = [{} for _ in ranges]
+        if by_row:
+            # Changes address global row numbers, so count each chunk's rows
+            # first and hand every chunk only the changes for its own rows
+            counts = pool.map(count_csv_chunk, [(src, start, end) for start, end in ranges])
+            for i in range(1, len(ranges)):
+                first_rows[i] = first_rows[i - 1] + counts[i - 1]
+            for y in sorted(by_row):
+                i = bisect.bisect_right(first_rows, y) - 1
+                if i >= 0 and y < first_rows[i] + counts[i]:
+                    chunk_changes[i][y] = by_row[y]
+                else:
+                    print(f"Warning: Row index {y} out of range. Skipping.")
+
+        tasks = [(src, start, end, write_handler_class, first_row, changes_for_chunk)
+                 for (start, end), first_row, changes_for_chunk in zip(ranges, first_rows, chunk_changes)]
+        written = 0
+        # Workers are still reading src, which may be dst itself
+        with open(dst + '.tmp', 'w', newline='') as f:
+            for count, text in pool.imap(convert_csv_chunk, tasks):
+                if not count:
+                    continue
+                f.write(write_handler_class.document_start if not written else write_handler_class.fragment_separator)
+                f.write(text)
+                written += count
+            f.write(write_handler_class.document_end if written else write_handler_class.empty_document)
+    os.replace(dst + '.tmp', dst)
+    return written
+
+
 # ------------------------------ Helper Functions ------------------------------
 def print_usage():
-    print(f"Usage: {sys.argv[0]} <src> <dst> <change1> <change2> ...")
+    print(f"Usage: {sys.argv[0]} [--workers N] [--index] [--columns I,J,...] <src> <dst> <change1> <change2> ...")
     print("Example:")
     print(f"  {sys.argv[0]} data.csv new_data.json 0,0,piano 1,1,mug")
+    print(f"  {sys.argv[0]} --workers 8 big.csv big.json")
+    print(f"  {sys.argv[0]} --index big.csv fixed.csv 3,120000,mug")
+    print(f"  {sys.argv[0]} --columns 0,2 data.cols subset.csv")
     sys.exit(1)
 
 def list_files_in_dir(path):
@@ -100,24 +477,46 @@ def get_handler_by_extension(file_path):
     ext_map = {
         '.csv': CSVHandler,
         '.json': JSONHandler,
-        '.pickle': PickleHandler
+        '.pickle': PickleHandler,
+        '.cols': ColumnarHandler
     }
 
     ext = os.path.splitext(file_path)[1].lower()
     if ext not in ext_map:
-        print(f"Unsupported file type '{ext}'. Supported: .csv, .json, .pickle")
+        print(f"Unsupported file type '{ext}'. Supported: .csv, .json, .pickle, .cols")
         sys.exit(1)
 
     return ext_map[ext]
 
 # ------------------------------ Main Program ------------------------------
 def main():
-    if len(sys.argv) < 3:
+    args = sys.argv[1:]
+    workers = 1
+    use_index = False
+    columns = None
+    while args and args[0].startswith('--'):
+        option = args.pop(0)
+        if option == '--workers':
+            try:
+                workers = int(args.pop(0))
+            except (IndexError, ValueError):
+                print_usage()
+        elif option == '--index':
+            use_index = True
+        elif option == '--columns':
+            try:
+                columns = [int(c) for c in args.pop(0).split(',')]
+            except (IndexError, ValueError):
+                print_usage()
+        else:
+            print_usage()
+
+    if len(args) < 2:
         print_usage()
 
-    src = sys.argv[1]
-    dst = sys.argv[2]
-    changes = sys.argv[3:]
+    src = args[0]
+    dst = args[1]
+    changes = args[2:]
 
     if not os.path.isfile(src):
         print(f"Error: '{src}' is not a valid file.")
@@ -128,31 +527,55 @@ def main():
     read_handler_class = get_handler_by_extension(src)
     write_handler_class = get_handler_by_extension(dst)
 
-    # Instantiate handler using source for reading
-    handler = read_handler_class(src, dst)
+    # Indexed mode: CSV-to-CSV edits go through the row-offset index and only
+    # touch the changed rows, which are the only ones displayed
+    if use_index and read_handler_class is CSVHandler and write_handler_class is CSVHandler:
+        try:
+            changed = CSVHandler(src, dst).write_indexed_changes(changes)
+            print("\nModified Rows:")
+            for y, row in changed.items():
+                print(f"{y}: " + ','.join(row))
+            print(f"\nFile successfully saved to: {dst}")
+        except Exception as e:
+            print(f"Error writing file: {e}")
+            sys.exit(1)
+        return
+    if use_index:
+        print("Note: --index only applies to CSV to CSV edits; converting normally.")
 
-    try:
-        handler.read()
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        sys.exit(1)
+    # Parallel mode: CSV sources are split into chunks converted by a process
+    # pool; rows never pass through this process, so they are not displayed
+    if workers > 1 and read_handler_class is CSVHandler and hasattr(write_handler_class, 'write_fragment'):
+        try:
+            written = convert_csv_parallel(src, dst, write_handler_class, changes, workers)
+            print(f"\nConverted {written} rows with {workers} workers.")
+            print(f"File successfully saved to: {dst}")
+        except Exception as e:
+            print(f"Error converting file: {e}")
+            sys.exit(1)
+        return
 
-    # Apply changes if provided
-    if changes:
-        handler.apply_changes(changes)
+    # Stream rows from the source through the changes and display into the
+    # destination format, so only one row is held in memory at a time
+    reader = read_handler_class(src, dst)
+    writer = write_handler_class(src, dst)
 
-    # Display current data
-    handler.display()
+    if columns is not None:
+        if read_handler_class is ColumnarHandler:
+            reader.columns = columns
+        else:
+            print("Note: --columns only applies to .cols sources; reading every column.")
+
+    rows = reader.iter_rows()
+    if changes:
+        rows = reader.changed_rows(rows, changes)
+    rows = reader.display_rows(rows)
 
-    # Write using destination format
     try:
-        # If writing format differs, temporarily swap class
-        if type(handler) != write_handler_class:
-            handler.__class__ = write_handler_class
-        handler.write()
+        writer.write_rows(rows)
         print(f"\nFile successfully saved to: {dst}")
     except Exception as e:
-        print(f"Error writing file: {e}")
+        print(f"Error converting file: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":